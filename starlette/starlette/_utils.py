@@ -1,14 +1,49 @@
 import asyncio
 import functools
+import types
 import typing
+import weakref
+from inspect import CO_COROUTINE
+
+# 可调用对象是否是异步的，结果对于同一个对象来说是不变的，所以缓存下来。
+# 使用 WeakKeyDictionary 而非 lru_cache，避免缓存让闭包、partial 等对象无法被回收。
+_async_callable_cache: "weakref.WeakKeyDictionary[typing.Any, bool]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
 def is_async_callable(obj: typing.Any) -> bool:
     """判断可调用对象是不是异步的
     """
+    # 每次访问绑定方法都会创建一个新的对象，用它作为键的话缓存项马上就会被回收，
+    # 所以使用底层的函数作为键，结果是一样的。
+    if isinstance(obj, types.MethodType):
+        obj = obj.__func__
+    try:
+        return _async_callable_cache[obj]
+    except (KeyError, TypeError):
+        # KeyError: 还未缓存；TypeError: 对象不可哈希或者不支持弱引用。
+        pass
+
+    result = _is_async_callable(obj)
+    try:
+        _async_callable_cache[obj] = result
+    except TypeError:
+        pass
+    return result
+
+
+def _is_async_callable(obj: typing.Any) -> bool:
     while isinstance(obj, functools.partial):
         obj = obj.func
 
+    # 快速路径：对于普通的 async 函数以及方法，直接检查代码对象的 CO_COROUTINE 标志位。
+    # 标志位不存在时仍然需要回退到 asyncio.iscoroutinefunction，
+    # 因为它还会识别带有 `_is_coroutine` 标记的对象(比如 AsyncMock)。
+    code = getattr(obj, "__code__", None)
+    if code is not None and code.co_flags & CO_COROUTINE:
+        return True
+
     # asyncio.iscoroutinefunction(obj):
     # obj 是一个函数对象
     # callable(obj) and asyncio.iscoroutinefunction(obj.__call__)
@@ -1,3 +1,4 @@
+import types
 import typing
 
 from starlette.datastructures import State, URLPath
@@ -11,6 +12,21 @@ from starlette.routing import BaseRoute, Router
 from starlette.types import ASGIApp, Receive, Scope, Send
 
 
+class _ASGIDispatchMiddleware:
+    """
+    `Starlette.middleware("asgi")` 使用的中间件，直接将 ASGI 调用交给
+    `dispatch(scope, receive, send, app)`，不像 `BaseHTTPMiddleware` 那样
+    构建 Request/Response 对象以及通过内存流(memory stream)转发响应体。
+    """
+
+    def __init__(self, app: ASGIApp, dispatch: typing.Callable) -> None:
+        self.app = app
+        self.dispatch = dispatch
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.dispatch(scope, receive, send, self.app)
+
+
 class Starlette:
     """
     创建一个应用程序实例
@@ -31,6 +47,20 @@ class Starlette:
     * **on_shutdown** - 应用程序关闭时，要运行的可调用对象列表。这些可调用对象不携带任何参数，并且能够时普通函数或异步(async)函数。
     """
 
+    # 使用 __slots__ 加快 `__call__` 等热路径中的属性访问。
+    # 保留 `__dict__`，因为仍然有代码会在应用程序实例上设置自定义属性，
+    # 不过应用程序级别的自定义数据更推荐保存在 `app.state` 中。
+    __slots__ = (
+        "_debug",
+        "state",
+        "router",
+        "exception_handlers",
+        "user_middleware",
+        "middleware_stack",
+        "__dict__",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         debug: bool = False,
@@ -61,11 +91,21 @@ class Starlette:
         self.router = Router(
             routes, on_startup=on_startup, on_shutdown=on_shutdown, lifespan=lifespan
         )
-        self.exception_handlers = (
-            {} if exception_handlers is None else dict(exception_handlers)
-        )
+        # 只读映射(types.MappingProxyType)不会被修改，无需复制；
+        # add_exception_handler 会在需要时复制一份再修改。
+        # 公开的类型仍然是 Dict，因为用户代码可能会直接修改 app.exception_handlers。
+        self.exception_handlers: typing.Dict[typing.Any, typing.Callable]
+        if exception_handlers is None:
+            self.exception_handlers = {}
+        elif isinstance(exception_handlers, types.MappingProxyType):
+            self.exception_handlers = typing.cast(
+                typing.Dict[typing.Any, typing.Callable], exception_handlers
+            )
+        else:
+            self.exception_handlers = dict(exception_handlers)
         self.user_middleware = [] if middleware is None else list(middleware)
-        self.middleware_stack = self.build_middleware_stack()
+        # 中间件栈延迟到第一次调用时才构建，修改中间件或异常处理程序时只需将其置空即可。
+        self.middleware_stack: typing.Optional[ASGIApp] = None
 
     def build_middleware_stack(self) -> ASGIApp:
         debug = self.debug
@@ -74,6 +114,8 @@ class Starlette:
             typing.Any, typing.Callable[[Request, Exception], Response]
         ] = {}
 
+        # 中间件栈只在需要时重新构建，所以每次构建时再拆分异常处理程序，
+        # 这样直接修改 app.exception_handlers 的用法也能生效。
         for key, value in self.exception_handlers.items():
             if key in (500, Exception):
                 error_handler = value
@@ -93,21 +135,17 @@ class Starlette:
         # )
 
         middleware = (
-            [Middleware(ServerErrorMiddleware, handler=error_handler, debug=debug)]
-            + self.user_middleware
-            + [
-                Middleware(
-                    ExceptionMiddleware, handlers=exception_handlers, debug=debug
-                )
-            ]
+            Middleware(ServerErrorMiddleware, handler=error_handler, debug=debug),
+            *self.user_middleware,
+            Middleware(ExceptionMiddleware, handlers=exception_handlers, debug=debug),
         )
 
         app = self.router
         # TODO: Later
         # removed reversed(...)
         # for cls, options in middleware:
-        for cls, options in reversed(middleware):
-            app = cls(app=app, **options)
+        for item in reversed(middleware):
+            app = item.cls(app=app, **item.options)
         return app
 
     @property
@@ -121,14 +159,22 @@ class Starlette:
     @debug.setter
     def debug(self, value: bool) -> None:
         self._debug = value
-        self.middleware_stack = self.build_middleware_stack()
+        self.middleware_stack = None
 
     def url_path_for(self, name: str, **path_params: typing.Any) -> URLPath:
         return self.router.url_path_for(name, **path_params)
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # 单次字典赋值已经是最快的方式了。Router.not_found、Request.app 以及 url_for
+        # 都依赖 scope["app"]，而且 lifespan 消息也需要它，所以不能交给中间件去设置。
         scope["app"] = self
-        await self.middleware_stack(scope, receive, send)
+        # 绑定到局部变量，避免检查之后再次查找实例属性。
+        # 注意这里不能直接返回协程而不 await，`__call__` 必须保持为 async 函数，
+        # 否则服务器以及 TestClient 会把应用程序识别为 ASGI2 应用程序。
+        middleware_stack = self.middleware_stack
+        if middleware_stack is None:
+            middleware_stack = self.middleware_stack = self.build_middleware_stack()
+        await middleware_stack(scope, receive, send)
 
     # 现在不再鼓励使用下面的用法，而是在 Starlette.__init__(...) 时进行配置。
     def on_event(self, event_type: str) -> typing.Callable:  # pragma: nocover
@@ -170,15 +216,17 @@ class Starlette:
         self, middleware_class: type, **options: typing.Any
     ) -> None:  # pragma: no cover
         self.user_middleware.insert(0, Middleware(middleware_class, **options))
-        self.middleware_stack = self.build_middleware_stack()
+        self.middleware_stack = None
 
     def add_exception_handler(
         self,
         exc_class_or_status_code: typing.Union[int, typing.Type[Exception]],
         handler: typing.Callable,
     ) -> None:  # pragma: no cover
+        if not isinstance(self.exception_handlers, dict):
+            self.exception_handlers = dict(self.exception_handlers)
         self.exception_handlers[exc_class_or_status_code] = handler
-        self.middleware_stack = self.build_middleware_stack()
+        self.middleware_stack = None
 
     def add_event_handler(
         self, event_type: str, func: typing.Callable
@@ -273,12 +321,20 @@ class Starlette:
         app = Starlette(middleware=middleware)
         """
 
-        assert (
-            middleware_type == "http"
-        ), 'Currently only middleware("http") is supported.'
+        assert middleware_type in (
+            "http",
+            "asgi",
+        ), 'Currently only middleware("http") and middleware("asgi") are supported.'
+
+        # middleware("http") 使用 `BaseHTTPMiddleware`，函数签名为 `func(request, call_next)`。
+        # middleware("asgi") 直接注册原始 ASGI 中间件，函数签名为
+        # `func(scope, receive, send, app)`，省去了 `BaseHTTPMiddleware` 的开销。
+        middleware_class = (
+            BaseHTTPMiddleware if middleware_type == "http" else _ASGIDispatchMiddleware
+        )
 
         def decorator(func: typing.Callable) -> typing.Callable:
-            self.add_middleware(BaseHTTPMiddleware, dispatch=func)
+            self.add_middleware(middleware_class, dispatch=func)
             return func
 
         return decorator
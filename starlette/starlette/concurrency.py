@@ -4,6 +4,7 @@ import typing
 import warnings
 
 import anyio
+from anyio.to_thread import run_sync as _run_sync
 
 if sys.version_info >= (3, 10):  # pragma: no cover
     from typing import ParamSpec
@@ -15,12 +16,19 @@ T = typing.TypeVar("T")
 P = ParamSpec("P")
 
 
+_run_until_first_complete_warned = False
+
+
 async def run_until_first_complete(*args: typing.Tuple[typing.Callable, dict]) -> None:
-    warnings.warn(
-        "run_until_first_complete is deprecated "
-        "and will be removed in a future version.",
-        DeprecationWarning,
-    )
+    # 废弃警告只发出一次，避免每次调用都去匹配警告过滤器并捕获调用栈。
+    global _run_until_first_complete_warned
+    if not _run_until_first_complete_warned:
+        _run_until_first_complete_warned = True
+        warnings.warn(
+            "run_until_first_complete is deprecated "
+            "and will be removed in a future version.",
+            DeprecationWarning,
+        )
 
     async with anyio.create_task_group() as task_group:
 
@@ -35,31 +43,71 @@ async def run_until_first_complete(*args: typing.Tuple[typing.Callable, dict]) -
 async def run_in_threadpool(
     func: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs
 ) -> T:
-    if kwargs:  # pragma: no cover
-        # run_sync 不接收 'kwargs', 所以在这里将 kwargs 和 func 绑定在一起
-        func = functools.partial(func, **kwargs)
     # https://anyio.readthedocs.io/en/stable/threads.html?highlight=to_thread.run_sync#calling-asynchronous-code-from-a-worker-thread
-    return await anyio.to_thread.run_sync(func, *args)
+    if not kwargs:
+        return await _run_sync(func, *args)
+    # run_sync 不接收 'kwargs', 所以在工作线程中通过 `_call_with_kwargs` 传递，
+    # 而不是每次调用都创建一个新的 functools.partial 对象。
+    return await _run_sync(_call_with_kwargs, func, args, kwargs)
 
 
-class _StopIteration(Exception):
-    pass
+def _call_with_kwargs(
+    func: typing.Callable[..., T],
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[str, typing.Any],
+) -> T:
+    return func(*args, **kwargs)
 
 
-def _next(iterator: typing.Iterator[T]) -> T:
-    # 不能从 threadpool 迭代器范围内引起(raise) `StopIteration`，并且在那个迭代器范围之外进行 catch,
-    # 所以强制将它们进入到其他的异常类型中。
-    try:
-        return next(iterator)
-    except StopIteration:
-        raise _StopIteration
+_SENTINEL: typing.Any = object()
 
 
-async def iterate_in_threadpool(
-    iterator: typing.Iterator[T],
+def _next_chunk(
+    iterator: typing.Iterator[T], chunk_size: int
+) -> typing.Tuple[typing.List[T], bool, typing.Optional[Exception]]:
+    # 不能从 threadpool 迭代器范围内引起(raise) `StopIteration`，并且在那个迭代器范围之外进行 catch,
+    # 所以使用 `next` 的默认值作为哨兵来表示迭代结束，返回已取得的元素以及迭代器是否已经耗尽。
+    # 如果在已经取得部分元素之后迭代器抛出了异常，同时返回这些元素以及异常，
+    # 由调用者先产出这些元素再抛出异常，不会丢失数据。
+    chunk: typing.List[T] = []
+    for _ in range(chunk_size):
+        try:
+            item = next(iterator, _SENTINEL)
+        except Exception as exc:
+            if not chunk:
+                raise
+            return chunk, True, exc
+        if item is _SENTINEL:
+            return chunk, True, None
+        chunk.append(item)
+    return chunk, False, None
+
+
+def iterate_in_threadpool(
+    iterator: typing.Iterator[T], chunk_size: int = 1
+) -> typing.AsyncIterator[T]:
+    """
+    在线程池中迭代同步迭代器。
+
+    每次切换到线程池时最多取 `chunk_size` 个元素，以此分摊线程切换的开销。
+    默认每次只取一个元素，因为对于生成较慢的迭代器(比如 server-sent events)，
+    批量获取会推迟已生成元素的发送。
+    迭代器抛出异常时，同一批中在此之前取得的元素会先被产出，然后再抛出该异常。
+    """
+    # 在调用时就检查参数，而不是等到开始迭代(比如响应已经开始发送)时才报错。
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    return _iterate_in_threadpool(iterator, chunk_size)
+
+
+async def _iterate_in_threadpool(
+    iterator: typing.Iterator[T], chunk_size: int
 ) -> typing.AsyncIterator[T]:
     while True:
-        try:
-            yield await anyio.to_thread.run_sync(_next, iterator)
-        except _StopIteration:
+        chunk, done, exc = await _run_sync(_next_chunk, iterator, chunk_size)
+        for item in chunk:
+            yield item
+        if exc is not None:
+            raise exc
+        if done:
             break
@@ -1,5 +1,8 @@
+import functools
+import re
 import tempfile
 import typing
+from collections import Counter
 from collections.abc import Sequence
 from shlex import shlex
 from urllib.parse import SplitResult, parse_qsl, urlencode, urlsplit
@@ -19,7 +22,63 @@ _KeyType = typing.TypeVar("_KeyType")
 _CovariantValueType = typing.TypeVar("_CovariantValueType", covariant=True)
 
 
+# `URL._from_parts` 只有在各个部分满足下面这些条件时，才能跳过 `urlsplit`，
+# 否则重新解析拼接后的 URL 所得到的各个部分可能与传入的不同。
+_URL_SCHEME_RE = re.compile(r"[a-z][a-z0-9+.-]*\Z")
+_URL_NETLOC_UNSAFE_RE = re.compile(r"[/?#\[\]\x00-\x20\x7f-\U0010ffff]")
+_URL_PATH_UNSAFE_RE = re.compile(r"[?#\t\r\n]")
+_URL_QUERY_UNSAFE_RE = re.compile(r"[#\t\r\n]")
+_URL_FRAGMENT_UNSAFE_RE = re.compile(r"[\t\r\n]")
+
+_DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443}
+
+
+@functools.lru_cache(maxsize=256)
+def _split_netloc(
+    netloc: str,
+) -> typing.Tuple[typing.Optional[str], typing.Optional[str], typing.Optional[str]]:
+    """
+    解析 netloc 中的 (username, password, hostname)，同一个 netloc 只需要解析一次。
+
+    `port` 不在这里解析，因为非法的端口会抛出 `ValueError`，不应该影响其他部分。
+    """
+    components = SplitResult("", netloc, "", "", "")
+    return components.username, components.password, components.hostname
+
+
+@functools.lru_cache(maxsize=1024)
+def _build_url_from_scope_parts(
+    scheme: str,
+    host_header: typing.Optional[bytes],
+    server: typing.Optional[typing.Tuple[str, typing.Optional[int]]],
+    root_path: str,
+    path: str,
+) -> typing.Tuple[str, SplitResult]:
+    """
+    由 ASGI scope 中的各个部分拼接出不带查询字符串的 URL 并解析。
+
+    同一个服务收到的请求 URL 往往重复性很高，所以缓存拼接以及 `urlsplit` 的结果。
+    查询字符串几乎每个请求都不同，且完全由客户端控制，所以不参与缓存。
+    """
+    path = root_path + path
+    if host_header is not None:
+        url = f"{scheme}://{host_header.decode('latin-1')}{path}"
+    elif server is None:
+        url = path
+    else:
+        host, port = server
+        if port == _DEFAULT_PORTS[scheme]:
+            url = f"{scheme}://{host}{path}"
+        else:
+            url = f"{scheme}://{host}:{port}{path}"
+    return url, urlsplit(url)
+
+
 class URL:
+    _url: str
+    _components: SplitResult
+    _query_list: typing.List[typing.Tuple[str, str]]
+
     def __init__(
         self,
         url: str = "",
@@ -29,78 +88,109 @@ class URL:
         if scope is not None:
             assert not url, 'Cannot set both "url" and "scope".'
             assert not components, 'Cannot set both "scope" and "**components".'
-            scheme = scope.get("scheme", "http")
             server = scope.get("server", None)
-            path = scope.get("root_path", "") + scope["path"]
-            query_string = scope.get("query_string", b"")
-
             host_header = None
             for key, value in scope["headers"]:
                 if key == b"host":
-                    host_header = value.decode("latin-1")
+                    host_header = value
                     break
 
-            if host_header is not None:
-                url = f"{scheme}://{host_header}{path}"
-            elif server is None:
-                url = path
-            else:
-                host, port = server
-                default_port = {"http": 80, "https": 443, "ws": 80, "wss": 443}[scheme]
-                if port == default_port:
-                    url = f"{scheme}://{host}{path}"
-                else:
-                    url = f"{scheme}://{host}:{port}{path}"
-
+            url, split_result = _build_url_from_scope_parts(
+                scope.get("scheme", "http"),
+                host_header,
+                None if server is None else tuple(server),
+                scope.get("root_path", ""),
+                scope["path"],
+            )
+            query_string = scope.get("query_string", b"")
             if query_string:
-                url += "?" + query_string.decode()
+                url = f"{url}?{query_string.decode()}"
+                split_result = urlsplit(url)
+            self._url, self._components = url, split_result
+            return
         elif components:
             assert not url, 'Cannot set both "url" and "**components".'
-            url = URL("").replace(**components).components.geturl()
+            replaced = URL("").replace(**components)
+            self._url = replaced._url
+            self._components = replaced._components
+            return
 
         self._url = url
+        self._components = urlsplit(url)
+
+    @classmethod
+    def _from_parts(
+        cls, scheme: str, netloc: str, path: str, query: str, fragment: str
+    ) -> "URL":
+        """
+        由已经拆分好的各个部分直接构建 URL，避免 `geturl()` 之后再 `urlsplit` 一次。
+
+        对于重新解析后可能得到不同结果的部分(比如 path 中含有 `?`)，
+        回退到完整的解析。
+        """
+        if (
+            not netloc
+            or _URL_SCHEME_RE.match(scheme) is None
+            or _URL_NETLOC_UNSAFE_RE.search(netloc) is not None
+            or (path and path[0] != "/")
+            or _URL_PATH_UNSAFE_RE.search(path) is not None
+            or _URL_QUERY_UNSAFE_RE.search(query) is not None
+            or _URL_FRAGMENT_UNSAFE_RE.search(fragment) is not None
+        ):
+            return cls(SplitResult(scheme, netloc, path, query, fragment).geturl())
+
+        url_str = f"{scheme}://{netloc}{path}"
+        if query:
+            url_str += f"?{query}"
+        if fragment:
+            url_str += f"#{fragment}"
+
+        url = cls.__new__(cls)
+        url._url = url_str
+        url._components = SplitResult(scheme, netloc, path, query, fragment)
+        return url
 
     @property
     def components(self) -> SplitResult:
-        if not hasattr(self, "_components"):
-            self._components = urlsplit(self._url)
         return self._components
 
     @property
     def scheme(self) -> str:
-        return self.components.scheme
+        return self._components.scheme
 
     @property
     def netloc(self) -> str:
-        return self.components.netloc
+        return self._components.netloc
 
     @property
     def path(self) -> str:
-        return self.components.path
+        return self._components.path
 
     @property
     def query(self) -> str:
-        return self.components.query
+        return self._components.query
 
     @property
     def fragment(self) -> str:
-        return self.components.fragment
+        return self._components.fragment
 
     @property
     def username(self) -> typing.Union[None, str]:
-        return self.components.username
+        return _split_netloc(self._components.netloc)[0]
 
     @property
     def password(self) -> typing.Union[None, str]:
-        return self.components.password
+        return _split_netloc(self._components.netloc)[1]
 
     @property
     def hostname(self) -> typing.Union[None, str]:
-        return self.components.hostname
+        return _split_netloc(self._components.netloc)[2]
 
     @property
     def port(self) -> typing.Optional[int]:
-        return self.components.port
+        if not hasattr(self, "_port"):
+            self._port = self._components.port
+        return self._port
 
     @property
     def is_secure(self) -> bool:
@@ -129,29 +219,39 @@ class URL:
 
             kwargs["netloc"] = netloc
         # self.components: SplitResult
-        components = self.components._replace(**kwargs)
-        return self.__class__(components.geturl())
+        components = self._components._replace(**kwargs)
+        return self._from_parts(*components)
+
+    def _query_items(self) -> typing.List[typing.Tuple[str, str]]:
+        # 解析后的查询参数缓存在实例上，多次修改查询参数时不必重复 parse_qsl。
+        if not hasattr(self, "_query_list"):
+            self._query_list = parse_qsl(self.query, keep_blank_values=True)
+        return self._query_list
+
+    def _with_query(self, items: typing.List[typing.Tuple[str, str]]) -> "URL":
+        scheme, netloc, path, _, fragment = self._components
+        return self._from_parts(scheme, netloc, path, urlencode(items), fragment)
 
     def include_query_params(self, **kwargs: typing.Any) -> "URL":
-        params = MultiDict(parse_qsl(self.query, keep_blank_values=True))
-        params.update({str(key): str(value) for key, value in kwargs.items()})
-        query = urlencode(params.multi_items())
-        return self.replace(query=query)
+        updates = {str(key): str(value) for key, value in kwargs.items()}
+        items = [(k, v) for (k, v) in self._query_items() if k not in updates]
+        items.extend(updates.items())
+        return self._with_query(items)
 
     def replace_query_params(self, **kwargs: typing.Any) -> "URL":
-        query = urlencode([(str(key), str(value)) for key, value in kwargs.items()])
-        return self.replace(query=query)
+        return self._with_query(
+            [(str(key), str(value)) for key, value in kwargs.items()]
+        )
 
     def remove_query_params(
         self, keys: typing.Union[str, typing.Sequence[str]]
     ) -> "URL":
         if isinstance(keys, str):
             keys = [keys]
-        params = MultiDict(parse_qsl(self.query, keep_blank_values=True))
-        for key in keys:
-            params.pop(key, None)
-        query = urlencode(params.multi_items())
-        return self.replace(query=query)
+        removed = set(keys)
+        return self._with_query(
+            [(k, v) for (k, v) in self._query_items() if k not in removed]
+        )
 
     def __eq__(self, other: typing.Any) -> bool:
         return str(self) == str(other)
@@ -216,12 +316,19 @@ class Secret:
         return bool(self._value)
 
 
+_SHLEX_SPECIAL_RE = re.compile(r"[\"'#\\]")
+
+
 class CommaSeparatedStrings(Sequence):
     """
     逗号分隔的字符串
     """
     def __init__(self, value: typing.Union[str, typing.Sequence[str]]):
-        if isinstance(value, str):
+        if isinstance(value, str) and not _SHLEX_SPECIAL_RE.search(value):
+            # 没有引号、注释或转义字符时，shlex 的结果与直接按逗号分割相同，
+            # 而 str.split 比逐个字符解析的 shlex 快得多。
+            self._items = [item.strip() for item in value.split(",") if item]
+        elif isinstance(value, str):
             splitter = shlex(value, posix=True)
             # 按逗号进行字符串分割
             splitter.whitespace = ","
@@ -319,7 +426,14 @@ class ImmutableMultiDict(typing.Mapping[_KeyType, _CovariantValueType]):
     def __eq__(self, other: typing.Any) -> bool:
         if not isinstance(other, self.__class__):
             return False
-        return sorted(self._list) == sorted(other._list)
+        if len(self._list) != len(other._list):
+            return False
+        try:
+            # 按多重集合(multiset)比较，O(n) 并且不需要排序。
+            return Counter(self._list) == Counter(other._list)
+        except TypeError:
+            # 值不可哈希时回退到排序比较。
+            return sorted(self._list) == sorted(other._list)
 
     def __repr__(self) -> str:
         class_name = self.__class__.__name__
@@ -336,8 +450,11 @@ class MultiDict(ImmutableMultiDict[typing.Any, typing.Any]):
         del self._dict[key]
 
     def pop(self, key: typing.Any, default: typing.Any = None) -> typing.Any:
+        # `_dict` 与 `_list` 中的键总是一致的，键不存在时无需扫描列表。
+        if key not in self._dict:
+            return default
         self._list = [(k, v) for k, v in self._list if k != key]
-        return self._dict.pop(key, default)
+        return self._dict.pop(key)
 
     def popitem(self) -> typing.Tuple:
         key, value = self._dict.popitem()
@@ -345,8 +462,16 @@ class MultiDict(ImmutableMultiDict[typing.Any, typing.Any]):
         return key, value
 
     def poplist(self, key: typing.Any) -> typing.List:
-        values = [v for k, v in self._list if k == key]
-        self.pop(key)
+        # 一次遍历同时得到保留的条目以及被移除的值。
+        kept: typing.List[typing.Tuple[typing.Any, typing.Any]] = []
+        values = []
+        for k, v in self._list:
+            if k == key:
+                values.append(v)
+            else:
+                kept.append((k, v))
+        self._list = kept
+        self._dict.pop(key, None)
         return values
 
     def clear(self) -> None:
@@ -364,8 +489,8 @@ class MultiDict(ImmutableMultiDict[typing.Any, typing.Any]):
         if not values:
             self.pop(key, None)
         else:
-            existing_items = [(k, v) for (k, v) in self._list if k != key]
-            self._list = existing_items + [(key, value) for value in values]
+            self._list = [(k, v) for (k, v) in self._list if k != key]
+            self._list.extend((key, value) for value in values)
             self._dict[key] = values[-1]
 
     def append(self, key: typing.Any, value: typing.Any) -> None:
@@ -382,9 +507,11 @@ class MultiDict(ImmutableMultiDict[typing.Any, typing.Any]):
         **kwargs: typing.Any,
     ) -> None:
         value = MultiDict(*args, **kwargs)
-        existing_items = [(k, v) for (k, v) in self._list if k not in value.keys()]
-        self._list = existing_items + value.multi_items()
-        self._dict.update(value)
+        # value._dict 的键视图支持 O(1) 的成员判断，这里只需取一次。
+        excluded = value._dict.keys()
+        self._list = [(k, v) for (k, v) in self._list if k not in excluded]
+        self._list.extend(value._list)
+        self._dict.update(value._dict)
 
 
 class QueryParams(ImmutableMultiDict[str, str]):
@@ -415,11 +542,27 @@ class QueryParams(ImmutableMultiDict[str, str]):
             )
         else:
             super().__init__(*args, **kwargs)  # type: ignore
-        self._list = [(str(k), str(v)) for k, v in self._list]
-        self._dict = {str(k): str(v) for k, v in self._dict.items()}
+
+        # parse_qsl 返回的已经是 (str, str)，只有其他来源的数据才需要转换为 str。
+        if kwargs or not isinstance(value, (str, bytes)):
+            self._list = [(str(k), str(v)) for k, v in self._list]
+            self._dict = {str(k): str(v) for k, v in self._dict.items()}
+        # QueryParams 是不可变的，所以编码后的查询字符串可以缓存下来。
+        self._str: typing.Optional[str] = None
+        # 大多数查询字符串中没有重复的键，此时 getlist 可以直接查字典而不必扫描列表。
+        self._has_duplicates = len(self._list) != len(self._dict)
+
+    def getlist(self, key: typing.Any) -> typing.List[str]:
+        if self._has_duplicates:
+            return super().getlist(key)
+        if key in self._dict:
+            return [self._dict[key]]
+        return []
 
     def __str__(self) -> str:
-        return urlencode(self._list)
+        if self._str is None:
+            self._str = urlencode(self._list)
+        return self._str
 
     def __repr__(self) -> str:
         class_name = self.__class__.__name__
@@ -451,6 +594,11 @@ class UploadFile:
         else:
             self.file = file
         self.headers = headers or Headers()
+        # write() 中使用：SpooledTemporaryFile 一旦写入磁盘就不会再回到内存中，
+        # 而只有写入后文件的位置超过 `_max_size` 时才可能写入磁盘，
+        # 所以在此之前无需每次写入都检查 `_rolled`。
+        self._rolled_to_disk = not self._in_memory
+        self._max_memory_size = getattr(self.file, "_max_size", 0)
 
     @property
     def _in_memory(self) -> bool:
@@ -459,11 +607,16 @@ class UploadFile:
         return not rolled_to_disk
 
     async def write(self, data: bytes) -> None:
-        if self._in_memory:
-            # 文件保存在内存中
-            self.file.write(data)
-        else:
+        if self._rolled_to_disk:
             await run_in_threadpool(self.file.write, data)
+            return
+
+        # 文件保存在内存中
+        self.file.write(data)
+        # 按文件当前的位置判断而不是累计写入的字节数，因为 seek() 之后再写入时，
+        # SpooledTemporaryFile 同样是按位置决定是否写入磁盘。
+        if self.file.tell() > self._max_memory_size:
+            self._rolled_to_disk = not self._in_memory
 
     async def read(self, size: int = -1) -> bytes:
         if self._in_memory:
@@ -507,6 +660,14 @@ class FormData(ImmutableMultiDict[str, typing.Union[UploadFile, str]]):
                 await value.close()
 
 
+@functools.lru_cache(maxsize=256)
+def _encode_lower(key: str) -> bytes:
+    # 头部名称是一个很小的有限集合，缓存转换结果。
+    # 头部名称只能由 ASCII 字符组成，所以直接在 bytes 上转换为小写，
+    # 省去 `str.lower()` 额外分配的字符串。
+    return key.encode("latin-1").lower()
+
+
 class Headers(typing.Mapping[str, str]):
     """
     一个可变并且忽略大小写的 multidict。
@@ -519,34 +680,76 @@ class Headers(typing.Mapping[str, str]):
         scope: typing.Optional[typing.Mapping[str, typing.Any]] = None,
     ) -> None:
         self._list: typing.List[typing.Tuple[bytes, bytes]] = []
+        # `_list` 是否只属于这个对象。通过 `raw=` 或者 `scope=` 传入的列表会与外部共享
+        # (比如 `scope["headers"]`、`Response.raw_headers`)，外部可能原地修改它们，
+        # 所以只有自己持有的列表才能缓存索引。
+        self._owns_list = False
+        # 小写头部名称到其所有值的索引，在第一次查找时构建。
+        self._index: typing.Optional[typing.Dict[bytes, typing.List[bytes]]] = None
+        # 解码后的 (key, value) 列表，供 keys()/values()/items() 共用。
+        self._items: typing.Optional[typing.List[typing.Tuple[str, str]]] = None
         if headers is not None:
             assert raw is None, 'Cannot set both "headers" and "raw".'
             assert scope is None, 'Cannot set both "headers" and "scope".'
-            self._list = [
-                (key.lower().encode("latin-1"), value.encode("latin-1"))
-                for key, value in headers.items()
-            ]
+            self._owns_list = True
+            # 头部本来就是字符串，直接保存解码后的形式，避免之后再从 bytes 解码回来。
+            items = []
+            for key, value in headers.items():
+                encoded_key = _encode_lower(key)
+                self._list.append((encoded_key, value.encode("latin-1")))
+                items.append((encoded_key.decode("latin-1"), value))
+            self._items = items
         elif raw is not None:
             assert scope is None, 'Cannot set both "raw" and "scope".'
             self._list = raw
         elif scope is not None:
             self._list = scope["headers"]
 
+    def _reset_caches(self) -> None:
+        self._index = None
+        self._items = None
+
+    def _get_index(self) -> typing.Optional[typing.Dict[bytes, typing.List[bytes]]]:
+        # 共享的列表返回 None，由调用者直接扫描列表。
+        if not self._owns_list:
+            return None
+        index = self._index
+        if index is None:
+            index = {}
+            for header_key, header_value in self._list:
+                if header_key in index:
+                    index[header_key].append(header_value)
+                else:
+                    index[header_key] = [header_value]
+            self._index = index
+        return index
+
     @property
     def raw(self) -> typing.List[typing.Tuple[bytes, bytes]]:
         return list(self._list)
 
+    def _get_items(self) -> typing.List[typing.Tuple[str, str]]:
+        # 与 `_get_index` 一样，只有自己持有的列表才缓存解码后的结果。
+        items = self._items
+        if items is None:
+            items = [
+                (key.decode("latin-1"), value.decode("latin-1"))
+                for key, value in self._list
+            ]
+            if self._owns_list:
+                self._items = items
+        return items
+
     def keys(self) -> typing.List[str]:  # type: ignore
-        return [key.decode("latin-1") for key, value in self._list]
+        return [key for key, value in self._get_items()]
 
     def values(self) -> typing.List[str]:  # type: ignore
-        return [value.decode("latin-1") for key, value in self._list]
+        return [value for key, value in self._get_items()]
 
     def items(self) -> typing.List[typing.Tuple[str, str]]:  # type: ignore
-        return [
-            (key.decode("latin-1"), value.decode("latin-1"))
-            for key, value in self._list
-        ]
+        items = self._get_items()
+        # 缓存的列表不能直接交给调用者，否则调用者的修改会影响缓存。
+        return list(items) if self._owns_list else items
 
     def get(self, key: str, default: typing.Any = None) -> typing.Any:
         try:
@@ -555,25 +758,39 @@ class Headers(typing.Mapping[str, str]):
             return default
 
     def getlist(self, key: str) -> typing.List[str]:
-        get_header_key = key.lower().encode("latin-1")
-        return [
-            item_value.decode("latin-1")
-            for item_key, item_value in self._list
-            if item_key == get_header_key
-        ]
+        get_header_key = _encode_lower(key)
+        index = self._get_index()
+        if index is not None:
+            values: typing.Iterable[bytes] = index.get(get_header_key, ())
+        else:
+            values = [
+                item_value
+                for item_key, item_value in self._list
+                if item_key == get_header_key
+            ]
+        return [value.decode("latin-1") for value in values]
 
     def mutablecopy(self) -> "MutableHeaders":
         return MutableHeaders(raw=self._list[:])
 
     def __getitem__(self, key: str) -> str:
-        get_header_key = key.lower().encode("latin-1")
-        for header_key, header_value in self._list:
-            if header_key == get_header_key:
-                return header_value.decode("latin-1")
+        get_header_key = _encode_lower(key)
+        index = self._get_index()
+        if index is not None:
+            values = index.get(get_header_key)
+            if values is not None:
+                return values[0].decode("latin-1")
+        else:
+            for header_key, header_value in self._list:
+                if header_key == get_header_key:
+                    return header_value.decode("latin-1")
         raise KeyError(key)
 
     def __contains__(self, key: typing.Any) -> bool:
-        get_header_key = key.lower().encode("latin-1")
+        get_header_key = _encode_lower(key)
+        index = self._get_index()
+        if index is not None:
+            return get_header_key in index
         for header_key, header_value in self._list:
             if header_key == get_header_key:
                 return True
@@ -588,13 +805,20 @@ class Headers(typing.Mapping[str, str]):
     def __eq__(self, other: typing.Any) -> bool:
         if not isinstance(other, Headers):
             return False
-        return sorted(self._list) == sorted(other._list)
+        if len(self._list) != len(other._list):
+            return False
+        return Counter(self._list) == Counter(other._list)
 
     def __repr__(self) -> str:
         class_name = self.__class__.__name__
-        as_dict = dict(self.items())
-        if len(as_dict) == len(self):
-            return f"{class_name}({as_dict!r})"
+        # 先判断是否有重复的头部，只在确定没有重复时才构建解码后的字典。
+        index = self._get_index()
+        if index is None:
+            has_duplicates = len({key for key, value in self._list}) != len(self._list)
+        else:
+            has_duplicates = len(index) != len(self._list)
+        if not has_duplicates:
+            return f"{class_name}({dict(self._get_items())!r})"
         return f"{class_name}(raw={self.raw!r})"
 
 
@@ -603,45 +827,36 @@ class MutableHeaders(Headers):
         """
         设置头部中的 `key` 的值为 `value`，移除任何重复的条目。保持插入的顺序。
         """
-        set_key = key.lower().encode("latin-1")
+        set_key = _encode_lower(key)
         set_value = value.encode("latin-1")
 
-        found_indexes = []
-        for idx, (item_key, item_value) in enumerate(self._list):
-            if item_key == set_key:
-                found_indexes.append(idx)
-
-        # TODO: Later
-        # Why does it have to be reversed??
-        for idx in reversed(found_indexes[1:]):
-            del self._list[idx]
+        found_indexes = [
+            idx for idx, (item_key, _) in enumerate(self._list) if item_key == set_key
+        ]
 
-        if found_indexes:
-            idx = found_indexes[0]
-            self._list[idx] = (set_key, set_value)
-        else:
+        if not found_indexes:
             self._list.append((set_key, set_value))
+        elif len(found_indexes) == 1:
+            self._list[found_indexes[0]] = (set_key, set_value)
+        else:
+            # 存在重复的条目时，一次遍历重新构建列表，而不是逐个 `del`(每次都是 O(n))。
+            # 使用切片赋值原地修改，因为 `_list` 可能与外部共享(比如 `Response.raw_headers`)。
+            first = found_indexes[0]
+            self._list[first:] = [(set_key, set_value)] + [
+                item for item in self._list[first + 1 :] if item[0] != set_key
+            ]
+        self._reset_caches()
 
     def __delitem__(self, key: str) -> None:
         """
         移除头部中的某个 `key`。
         """
-        del_key = key.lower().encode("latin-1")
+        del_key = _encode_lower(key)
 
-        # TODO: Later
-        # How about del in one loop as following?
-
-        # for idx, (item_key, item_value) in enumerate(self._list):
-        #     if item_key == del_key:
-        #         del self._list[idx]
-
-        pop_indexes = []
-        for idx, (item_key, item_value) in enumerate(self._list):
-            if item_key == del_key:
-                pop_indexes.append(idx)
-
-        for idx in reversed(pop_indexes):
-            del self._list[idx]
+        # 一次遍历过滤掉所有匹配的条目，同样使用切片赋值原地修改。
+        if any(item_key == del_key for item_key, _ in self._list):
+            self._list[:] = [item for item in self._list if item[0] != del_key]
+        self._reset_caches()
 
     def __ior__(self, other: typing.Mapping) -> "MutableHeaders":
         if not isinstance(other, typing.Mapping):
@@ -658,6 +873,9 @@ class MutableHeaders(Headers):
 
     @property
     def raw(self) -> typing.List[typing.Tuple[bytes, bytes]]:
+        # 列表交给了外部，之后可能被原地修改，所以不能再缓存索引以及解码结果。
+        self._owns_list = False
+        self._reset_caches()
         return self._list
 
     def setdefault(self, key: str, value: str) -> str:
@@ -665,7 +883,7 @@ class MutableHeaders(Headers):
         如果头部（header）中的 `key` 不存在，那么在头部中设置该 `key` 为 `value`。
         返回头部中的该 `key` 的值。
         """
-        set_key = key.lower().encode("latin-1")
+        set_key = _encode_lower(key)
         set_value = value.encode("latin-1")
 
         # TODO: Removed idx, maybe?
@@ -673,6 +891,7 @@ class MutableHeaders(Headers):
             if item_key == set_key:
                 return item_value.decode("latin-1")
         self._list.append((set_key, set_value))
+        self._reset_caches()
         return value
 
     def update(self, other: typing.Mapping) -> None:
@@ -683,9 +902,10 @@ class MutableHeaders(Headers):
         """
         Append a header, preserving any duplicate entries.
         """
-        append_key = key.lower().encode("latin-1")
+        append_key = _encode_lower(key)
         append_value = value.encode("latin-1")
         self._list.append((append_key, append_value))
+        self._reset_caches()
 
     def add_vary_header(self, vary: str) -> None:
         existing = self.get("vary")
@@ -701,22 +921,25 @@ class State:
     用于`request.state`以及 `app.state`。
     """
 
-    _state: typing.Dict[str, typing.Any]
-
     def __init__(self, state: typing.Optional[typing.Dict[str, typing.Any]] = None):
         if state is None:
             state = {}
-        super().__setattr__("_state", state)
+        # 直接把状态字典作为实例的 __dict__，属性的读写删除都走解释器原生的路径，
+        # 不再经过 Python 层面的 __getattr__/__setattr__。
+        # 同一个 scope 中的多个 State 实例仍然共享同一个字典。
+        super().__setattr__("__dict__", state)
 
-    def __setattr__(self, key: typing.Any, value: typing.Any) -> None:
-        self._state[key] = value
+    @property
+    def _state(self) -> typing.Dict[str, typing.Any]:
+        return self.__dict__
 
     def __getattr__(self, key: typing.Any) -> typing.Any:
-        try:
-            return self._state[key]
-        except KeyError:
-            message = "'{}' object has no attribute '{}'"
-            raise AttributeError(message.format(self.__class__.__name__, key))
-
-    def __delattr__(self, key: typing.Any) -> None:
-        del self._state[key]
+        # 只有在正常的属性查找失败时才会调用，不影响已存在属性的访问速度。
+        # 保留它是为了让类型检查器允许访问任意的状态属性(比如 `request.state.user`)。
+        message = "'{}' object has no attribute '{}'"
+        raise AttributeError(message.format(self.__class__.__name__, key))
+
+    if typing.TYPE_CHECKING:
+        # 运行时使用解释器原生的属性赋值，这里只是告诉类型检查器可以设置任意属性。
+        def __setattr__(self, key: typing.Any, value: typing.Any) -> None:
+            ...
@@ -2,6 +2,8 @@ import typing
 
 
 class Middleware:
+    __slots__ = ("cls", "options")
+
     def __init__(self, cls: type, **options: typing.Any) -> None:
         self.cls = cls
         self.options = options
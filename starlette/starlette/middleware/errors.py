@@ -1,6 +1,10 @@
+import functools
 import html
 import inspect
+import linecache
+import re
 import traceback
+import types
 import typing
 
 from starlette._utils import is_async_callable
@@ -100,6 +104,17 @@ TEMPLATE = """
 </html>
 """
 
+
+def _escape_format(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+# 样式以及脚本都是常量，模块加载时就先填入模板，每次出错时只需要格式化剩下的两个字段。
+# 其中的花括号需要转义，避免被 str.format 当作替换字段。
+_PREFILLED_TEMPLATE = TEMPLATE.replace("{styles}", _escape_format(STYLES)).replace(
+    "{js}", _escape_format(JS)
+)
+
 FRAME_TEMPLATE = """
 <div>
     <p class="frame-title">File <span class="frame-filename">{frame_filename}</span>,
@@ -121,6 +136,81 @@ CENTER_LINE = """
 <span class="lineno">{lineno}.</span> {line}</span></p>
 """
 
+# 与 `html.escape(line).replace(" ", "&nbsp")` 等价，但只需要遍历一次字符串。
+_LINE_ESCAPE_TABLE = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "'": "&#x27;",
+        " ": "&nbsp",
+    }
+)
+
+MAX_ERROR_TEXT_LENGTH = 2048
+
+_HTML_SPECIAL_RE = re.compile(r"[&<>\"']")
+
+
+def _escape(text: str) -> str:
+    # 文件名、函数名等通常不包含需要转义的字符，此时直接返回原字符串。
+    if _HTML_SPECIAL_RE.search(text) is None:
+        return text
+    return html.escape(text)
+
+
+# 同一个 traceback 中文件名、函数名会反复出现(递归、框架的分发调用等)，
+# 不同请求之间也大多相同，所以缓存转义的结果。
+@functools.lru_cache(maxsize=256)
+def _escape_frame_name(name: str) -> str:
+    return _escape(name)
+
+
+def _get_inner_frames(
+    tb: typing.Optional[types.TracebackType], context: int
+) -> typing.List[inspect.FrameInfo]:
+    """
+    与 `inspect.getinnerframes(tb, context)` 的结果相同，但是更轻量：
+    同一个文件只检查以及读取一次源码，也不需要 inspect 查找源文件的那一套逻辑。
+    """
+    file_lines: typing.Dict[str, typing.List[str]] = {}
+    frames = []
+    while tb is not None:
+        frame = tb.tb_frame
+        lineno = tb.tb_lineno
+        filename = frame.f_code.co_filename
+
+        lines = file_lines.get(filename)
+        if lines is None:
+            linecache.checkcache(filename)
+            lines = file_lines[filename] = linecache.getlines(filename, frame.f_globals)
+
+        code_context: typing.Optional[typing.List[str]] = None
+        index: typing.Optional[int] = None
+        if lines:
+            start = lineno - 1 - context // 2
+            start = max(0, min(start, len(lines) - context))
+            code_context = lines[start : start + context]
+            index = lineno - 1 - start
+
+        frames.append(
+            inspect.FrameInfo(
+                frame, filename, lineno, frame.f_code.co_name, code_context, index
+            )
+        )
+        tb = tb.tb_next
+    return frames
+
+
+# 默认的 500 响应是固定的，在模块加载时就编码好，出错时直接发送。
+_INTERNAL_SERVER_ERROR_RESPONSE = PlainTextResponse(
+    "Internal Server Error", status_code=500
+)
+_INTERNAL_SERVER_ERROR_HEADERS = tuple(_INTERNAL_SERVER_ERROR_RESPONSE.raw_headers)
+_INTERNAL_SERVER_ERROR_BODY = _INTERNAL_SERVER_ERROR_RESPONSE.body
+del _INTERNAL_SERVER_ERROR_RESPONSE
+
 
 class ServerErrorMiddleware:
     """
@@ -129,7 +219,7 @@ class ServerErrorMiddleware:
     如果设置 'debug' 为 True，那么会返回堆栈(traceback)跟踪。否则，将会调用处理该错误的异常处理程序。
 
     这个中间件通常来说被用来包裹所有其他中间件，为的是栈中任何地方未被处理的异常总是能够响应适当的 500 响应。
-    
+
     """
 
     def __init__(
@@ -141,6 +231,12 @@ class ServerErrorMiddleware:
         self.app = app
         self.handler = handler
         self.debug = debug
+        # 在初始化时判断一次处理程序是否为异步的，而不是每次出错时都判断。
+        self._handler_is_async = handler is not None and is_async_callable(handler)
+        # 默认的 error_response 用不到 request，没有被子类重写时可以省去构建 Request。
+        self._default_error_response = (
+            type(self).error_response is ServerErrorMiddleware.error_response
+        )
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
@@ -150,7 +246,7 @@ class ServerErrorMiddleware:
         response_started = False
 
         async def _send(message: Message) -> None:
-            nonlocal response_started, send
+            nonlocal response_started
 
             if message["type"] == "http.response.start":
                 response_started = True
@@ -159,16 +255,33 @@ class ServerErrorMiddleware:
         try:
             await self.app(scope, receive, _send)
         except Exception as exc:
-            request = Request(scope)
             if self.debug:
                 # 处于开发模式，则返回堆栈跟踪(traceback)响应。
-                response = self.debug_response(request, exc)
+                response = self.debug_response(Request(scope), exc)
             elif self.handler is None:
                 # 使用默认的 500 错误处理程序。
-                response = self.error_response(request, exc)
+                if self._default_error_response:
+                    if not response_started:
+                        await send(
+                            {
+                                "type": "http.response.start",
+                                "status": 500,
+                                # 每次都复制一份，避免服务器修改共享的列表。
+                                "headers": list(_INTERNAL_SERVER_ERROR_HEADERS),
+                            }
+                        )
+                        await send(
+                            {
+                                "type": "http.response.body",
+                                "body": _INTERNAL_SERVER_ERROR_BODY,
+                            }
+                        )
+                    raise exc
+                response = self.error_response(Request(scope), exc)
             else:
                 # 使用用户自定义的 500 错误处理程序。
-                if is_async_callable(self.handler):
+                request = Request(scope)
+                if self._handler_is_async:
                     response = await self.handler(request, exc)
                 else:
                     response = await run_in_threadpool(self.handler, request, exc)
@@ -183,15 +296,14 @@ class ServerErrorMiddleware:
     def format_line(
         self, index: int, line: str, frame_lineno: int, frame_index: int
     ) -> str:
-        values = {
-            # HTML escape - line could contain < or >
-            "line": html.escape(line).replace(" ", "&nbsp"),
-            "lineno": (frame_lineno - frame_index) + index,
-        }
+        # HTML escape - line could contain < or >
+        line = line.translate(_LINE_ESCAPE_TABLE)
+        lineno = (frame_lineno - frame_index) + index
 
+        # 直接传入关键字参数，省去每一行都构建一个字典再解包的开销。
         if index != frame_index:
-            return LINE.format(**values)
-        return CENTER_LINE.format(**values)
+            return LINE.format(lineno=lineno, line=line)
+        return CENTER_LINE.format(lineno=lineno, line=line)
 
     def generate_frame_html(self, frame: inspect.FrameInfo, is_collapsed: bool) -> str:
         code_context = "".join(
@@ -202,11 +314,11 @@ class ServerErrorMiddleware:
         values = {
             # HTML escape - filename could contain < or >, especially if it's a virtual
             # file e.g. <stdin> in the REPL
-            "frame_filename": html.escape(frame.filename),
+            "frame_filename": _escape_frame_name(frame.filename),
             "frame_lineno": frame.lineno,
             # HTML escape - if you try very hard it's possible to name a function with <
             # or >
-            "frame_name": html.escape(frame.function),
+            "frame_name": _escape_frame_name(frame.function),
             "code_context": code_context,
             "collapsed": "collapsed" if is_collapsed else "",
             "collapse_button": "+" if is_collapsed else "&#8210;",
@@ -214,26 +326,30 @@ class ServerErrorMiddleware:
         return FRAME_TEMPLATE.format(**values)
 
     def generate_html(self, exc: Exception, limit: int = 7) -> str:
-        traceback_obj = traceback.TracebackException.from_exception(
-            exc, capture_locals=True
-        )
-
         exc_html = ""
         is_collapsed = False
         exc_traceback = exc.__traceback__
         if exc_traceback is not None:
-            frames = inspect.getinnerframes(exc_traceback, limit)
+            frames = _get_inner_frames(exc_traceback, limit)
             for frame in reversed(frames):
                 exc_html += self.generate_frame_html(frame, is_collapsed)
                 is_collapsed = True
 
+        # 页面只用到了异常的类名以及描述，不需要构建 TracebackException
+        # (尤其是 capture_locals=True 会对每一帧的所有局部变量调用 repr())。
+        try:
+            exc_text = str(exc)
+        except Exception:
+            # 与 traceback 模块的处理方式保持一致。
+            exc_text = "<exception str() failed>"
+        if len(exc_text) > MAX_ERROR_TEXT_LENGTH:
+            # 异常描述可能非常大(比如包含了整个请求体)，截断以限制页面的大小。
+            exc_text = exc_text[:MAX_ERROR_TEXT_LENGTH] + "..."
+
         # escape error class and text
-        error = (
-            f"{html.escape(traceback_obj.exc_type.__name__)}: "
-            f"{html.escape(str(traceback_obj))}"
-        )
+        error = f"{_escape(type(exc).__name__)}: {_escape(exc_text)}"
 
-        return TEMPLATE.format(styles=STYLES, js=JS, error=error, exc_html=exc_html)
+        return _PREFILLED_TEMPLATE.format(error=error, exc_html=exc_html)
 
     def generate_plain_text(self, exc: Exception) -> str:
         return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
@@ -1,4 +1,6 @@
+import functools
 import typing
+import weakref
 
 from starlette._utils import is_async_callable
 from starlette.concurrency import run_in_threadpool
@@ -22,7 +24,12 @@ class ExceptionMiddleware:
         self._status_handlers: typing.Dict[int, typing.Callable] = {}
         self._exception_handlers: typing.Dict[
             typing.Type[Exception], typing.Callable
-        ] = {HTTPException: self.http_exception}
+        ] = {HTTPException: self._wrap_handler(self.http_exception)}
+        # 缓存每个异常类型沿着 MRO 查找到的处理程序(包括没有找到的情况)。
+        # 使用 WeakKeyDictionary，避免缓存让动态创建的异常类无法被回收。
+        self._handler_cache: "weakref.WeakKeyDictionary[type, typing.Optional[typing.Callable]]" = (  # noqa: E501
+            weakref.WeakKeyDictionary()
+        )
         if handlers is not None:
             for key, value in handlers.items():
                 self.add_exception_handler(key, value)
@@ -32,19 +39,37 @@ class ExceptionMiddleware:
         exc_class_or_status_code: typing.Union[int, typing.Type[Exception]],
         handler: typing.Callable[[Request, Exception], Response],
     ) -> None:
+        handler = self._wrap_handler(handler)
         if isinstance(exc_class_or_status_code, int):
             self._status_handlers[exc_class_or_status_code] = handler
         else:
             assert issubclass(exc_class_or_status_code, Exception)
             self._exception_handlers[exc_class_or_status_code] = handler
+            self._handler_cache.clear()
+
+    def _wrap_handler(self, handler: typing.Callable) -> typing.Callable:
+        # 在注册时就判断处理程序是否为异步的，同步的处理程序包装成在线程池中运行，
+        # 这样处理请求时就不需要每次都调用 is_async_callable 了。
+        if is_async_callable(handler):
+            return handler
+        return functools.partial(run_in_threadpool, handler)
 
     def _lookup_exception_handler(
         self, exc: Exception
     ) -> typing.Optional[typing.Callable]:
-        for cls in type(exc).__mro__:
+        exc_type = type(exc)
+        try:
+            return self._handler_cache[exc_type]
+        except KeyError:
+            pass
+
+        handler = None
+        for cls in exc_type.__mro__:
             if cls in self._exception_handlers:
-                return self._exception_handlers[cls]
-        return None
+                handler = self._exception_handlers[cls]
+                break
+        self._handler_cache[exc_type] = handler
+        return handler
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
@@ -79,10 +104,7 @@ class ExceptionMiddleware:
                 raise RuntimeError(msg) from exc
 
             request = Request(scope, receive=receive)
-            if is_async_callable(handler):
-                response = await handler(request, exc)
-            else:
-                response = await run_in_threadpool(handler, request, exc)
+            response = await handler(request, exc)
             await response(scope, receive, sender)
 
     def http_exception(self, request: Request, exc: HTTPException) -> Response:
@@ -231,11 +231,18 @@ class StreamingResponse(Response):
         headers: typing.Optional[typing.Mapping[str, str]] = None,
         media_type: typing.Optional[str] = None,
         background: typing.Optional[BackgroundTask] = None,
+        *,
+        threadpool_batch_size: int = 1,
     ) -> None:
         if isinstance(content, typing.AsyncIterable):
             self.body_iterator = content
         else:
-            self.body_iterator = iterate_in_threadpool(content)
+            # 同步迭代器在线程池中迭代，每次切换线程最多取 `threadpool_batch_size` 个元素。
+            # 生成很快的迭代器可以调大它来分摊切换线程的开销；默认为 1，
+            # 以免推迟生成较慢的迭代器(比如 server-sent events)已经生成的数据。
+            self.body_iterator = iterate_in_threadpool(
+                content, chunk_size=threadpool_batch_size
+            )
         self.status_code = status_code
         self.media_type = self.media_type if media_type is None else media_type
         self.background = background
@@ -1,8 +1,10 @@
+import inspect
+
 import pytest
 
 from starlette.applications import Starlette
 from starlette.background import BackgroundTask
-from starlette.middleware.errors import ServerErrorMiddleware
+from starlette.middleware.errors import ServerErrorMiddleware, _get_inner_frames
 from starlette.responses import JSONResponse, Response
 from starlette.routing import Route
 
@@ -21,6 +23,33 @@ def test_handler(test_client_factory):
     assert response.json() == {"detail": "Server Error"}
 
 
+def test_default_error_response(test_client_factory):
+    async def app(scope, receive, send):
+        raise RuntimeError("Something went wrong")
+
+    app = ServerErrorMiddleware(app)
+    client = test_client_factory(app, raise_server_exceptions=False)
+    response = client.get("/")
+    assert response.status_code == 500
+    assert response.text == "Internal Server Error"
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+
+
+def test_overridden_error_response(test_client_factory):
+    class CustomServerErrorMiddleware(ServerErrorMiddleware):
+        def error_response(self, request, exc):
+            return JSONResponse({"path": request.url.path}, status_code=500)
+
+    async def app(scope, receive, send):
+        raise RuntimeError("Something went wrong")
+
+    app = CustomServerErrorMiddleware(app)
+    client = test_client_factory(app, raise_server_exceptions=False)
+    response = client.get("/error")
+    assert response.status_code == 500
+    assert response.json() == {"path": "/error"}
+
+
 def test_debug_text(test_client_factory):
     async def app(scope, receive, send):
         raise RuntimeError("Something went wrong")
@@ -45,6 +74,47 @@ def test_debug_html(test_client_factory):
     assert "RuntimeError" in response.text
 
 
+def test_debug_html_truncates_long_error_text():
+    async def inner_app(scope, receive, send):
+        pass  # pragma: no cover
+
+    app = ServerErrorMiddleware(inner_app, debug=True)
+    content = app.generate_html(RuntimeError("x" * 10000))
+    assert "RuntimeError: " + "x" * 2048 + "..." in content
+    assert "x" * 2049 not in content
+
+
+def test_debug_html_when_str_fails():
+    class BrokenError(Exception):
+        def __str__(self):
+            raise ValueError()
+
+    async def inner_app(scope, receive, send):
+        pass  # pragma: no cover
+
+    app = ServerErrorMiddleware(inner_app, debug=True)
+    content = app.generate_html(BrokenError())
+    assert "BrokenError: &lt;exception str() failed&gt;" in content
+
+
+def test_inner_frames_match_inspect():
+    def fail(depth):
+        if depth == 0:
+            exec("raise RuntimeError('Something went wrong')")
+        fail(depth - 1)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        fail(2)
+
+    tb = exc_info.value.__traceback__
+    assert tb is not None
+    expected = inspect.getinnerframes(tb, 7)
+    frames = _get_inner_frames(tb, 7)
+    assert [tuple(frame)[1:] for frame in frames] == [
+        tuple(frame)[1:] for frame in expected
+    ]
+
+
 def test_debug_after_response_sent(test_client_factory):
     async def app(scope, receive, send):
         response = Response(b"", status_code=204)
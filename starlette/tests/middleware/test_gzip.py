@@ -1,7 +1,19 @@
+import gzip
+import random
+
+import anyio
+import pytest
+
 from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
 from starlette.middleware import Middleware
-from starlette.middleware.gzip import GZipMiddleware
-from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.middleware.gzip import (
+    STREAM_BUFFER_SIZE,
+    GZipMiddleware,
+    GZipResponder,
+    gzip_headers,
+)
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
 from starlette.routing import Route
 
 
@@ -76,3 +88,137 @@ def test_gzip_streaming_response(test_client_factory):
     assert response.text == "x" * 4000
     assert response.headers["Content-Encoding"] == "gzip"
     assert "Content-Length" not in response.headers
+
+
+def test_gzip_ignored_for_incompressible_content_type(test_client_factory):
+    def homepage(request):
+        async def generator(bytes, count):
+            for index in range(count):
+                yield bytes
+
+        streaming = generator(bytes=b"x" * 400, count=10)
+        return StreamingResponse(streaming, status_code=200, media_type="image/png")
+
+    app = Starlette(
+        routes=[Route("/", endpoint=homepage)],
+        middleware=[Middleware(GZipMiddleware)],
+    )
+
+    client = test_client_factory(app)
+    response = client.get("/", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.content == b"x" * 4000
+    assert "Content-Encoding" not in response.headers
+
+
+def test_gzip_svg_responses(test_client_factory):
+    def homepage(request):
+        return Response("<svg>" + "x" * 4000 + "</svg>", media_type="image/svg+xml")
+
+    app = Starlette(
+        routes=[Route("/", endpoint=homepage)],
+        middleware=[Middleware(GZipMiddleware)],
+    )
+
+    client = test_client_factory(app)
+    response = client.get("/", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.text == "<svg>" + "x" * 4000 + "</svg>"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < 4000
+
+
+def test_gzip_ignored_for_already_encoded_responses(test_client_factory):
+    def homepage(request):
+        return PlainTextResponse(
+            "x" * 4000, status_code=200, headers={"Content-Encoding": "identity"}
+        )
+
+    app = Starlette(
+        routes=[Route("/", endpoint=homepage)],
+        middleware=[Middleware(GZipMiddleware)],
+    )
+
+    client = test_client_factory(app)
+    response = client.get("/", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.text == "x" * 4000
+    assert response.headers["Content-Encoding"] == "identity"
+    assert int(response.headers["Content-Length"]) == 4000
+
+
+def run_gzip_responder(chunks):
+    sent = []
+
+    async def app(scope, receive, send):
+        headers = [(b"content-type", b"text/plain")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for chunk in chunks:
+            message = {"type": "http.response.body", "body": chunk}
+            await send({**message, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    responder = GZipResponder(app, minimum_size=500)
+    scope = {"type": "http", "headers": []}
+    anyio.run(responder, scope, None, send)
+
+    assert sent[0]["type"] == "http.response.start"
+    assert all(message["more_body"] for message in sent[1:-1])
+    assert sent[-1].get("more_body", False) is False
+    return [message["body"] for message in sent[1:]]
+
+
+def test_gzip_streaming_response_coalesces_small_chunks():
+    chunks = [b"x" * 400] * 10
+    bodies = run_gzip_responder(chunks)
+    # The first chunk is compressed on its own, the rest are buffered
+    # until the end of the response.
+    assert len(bodies) == 2
+    assert gzip.decompress(b"".join(bodies)) == b"".join(chunks)
+
+
+def test_gzip_streaming_response_flushes_buffered_chunks():
+    size = 100 * 1000
+    data = random.Random(0).getrandbits(size * 8).to_bytes(size, "little")
+    chunks = [data[index : index + 1000] for index in range(0, len(data), 1000)]
+    bodies = run_gzip_responder(chunks)
+    # Incompressible data makes zlib emit output each time the buffer
+    # reaches STREAM_BUFFER_SIZE.
+    assert len(bodies) > 2
+    assert all(bodies[:-1])
+    assert gzip.decompress(b"".join(bodies)) == data
+
+
+def test_gzip_streaming_response_skips_empty_chunks():
+    chunks = [b"x" * STREAM_BUFFER_SIZE] * 10
+    bodies = run_gzip_responder(chunks)
+    # Highly compressible data leaves zlib buffering, and the empty
+    # intermediate outputs are not sent.
+    assert len(bodies) < len(chunks)
+    assert all(bodies[:-1])
+    assert gzip.decompress(b"".join(bodies)) == b"".join(chunks)
+
+
+@pytest.mark.parametrize("content_length", [None, 1234])
+@pytest.mark.parametrize(
+    "raw_headers",
+    [
+        [],
+        [(b"content-type", b"text/plain"), (b"content-length", b"10")],
+        [(b"vary", b"Cookie"), (b"content-length", b"10"), (b"vary", b"Origin")],
+        [(b"content-length", b"10"), (b"x-a", b"1"), (b"content-length", b"11")],
+    ],
+)
+def test_gzip_headers_match_mutable_headers(raw_headers, content_length):
+    expected = MutableHeaders(raw=list(raw_headers))
+    expected["Content-Encoding"] = "gzip"
+    if content_length is None:
+        del expected["Content-Length"]
+    else:
+        expected["Content-Length"] = str(content_length)
+    expected.add_vary_header("Accept-Encoding")
+
+    assert gzip_headers(raw_headers, content_length) == expected.raw
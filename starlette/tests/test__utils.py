@@ -1,6 +1,6 @@
 import functools
 
-from starlette._utils import is_async_callable
+from starlette._utils import _async_callable_cache, is_async_callable
 
 
 def test_async_func():
@@ -77,3 +77,36 @@ def test_async_nested_partial():
     partial = functools.partial(async_func, b=2)
     nested_partial = functools.partial(partial, a=1)
     assert is_async_callable(nested_partial)
+
+
+def test_async_callable_cached():
+    async def async_func():
+        ...  # pragma: no cover
+
+    assert is_async_callable(async_func)
+    assert _async_callable_cache[async_func] is True
+
+
+def test_async_unhashable_object_call():
+    class Async:
+        __hash__ = None  # type: ignore[assignment]
+
+        async def __call__(self):
+            ...  # pragma: no cover
+
+    assert is_async_callable(Async())
+
+
+def test_async_bound_method_cached_by_function():
+    class Endpoint:
+        async def async_method(self):
+            ...  # pragma: no cover
+
+        def sync_method(self):
+            ...  # pragma: no cover
+
+    endpoint = Endpoint()
+    assert is_async_callable(endpoint.async_method)
+    assert not is_async_callable(endpoint.sync_method)
+    assert _async_callable_cache[Endpoint.async_method] is True
+    assert _async_callable_cache[Endpoint.sync_method] is False
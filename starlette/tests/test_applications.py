@@ -1,4 +1,5 @@
 import os
+import types
 from contextlib import asynccontextmanager
 
 import pytest
@@ -250,6 +251,102 @@ def test_app_debug(test_client_factory):
     assert app.debug
 
 
+def test_app_slots():
+    app = Starlette()
+    assert "middleware_stack" in Starlette.__slots__
+
+    setattr(app, "custom_attribute", True)
+    assert getattr(app, "custom_attribute")
+
+
+def test_app_add_exception_handler(test_client_factory):
+    async def homepage(request):
+        raise RuntimeError()
+
+    app = Starlette(routes=[Route("/", endpoint=homepage)])
+    app.add_exception_handler(500, error_500)
+    app.add_exception_handler(405, method_not_allowed)
+
+    client = test_client_factory(app, raise_server_exceptions=False)
+    response = client.get("/")
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Server Error"}
+
+    response = client.post("/")
+    assert response.status_code == 405
+    assert response.json() == {"detail": "Custom message"}
+
+
+def test_app_exception_handlers_mutated_directly(test_client_factory):
+    async def homepage(request):
+        raise KeyError()
+
+    async def key_error(request, exc):
+        return JSONResponse({"detail": "Key error"}, status_code=418)
+
+    app = Starlette(routes=[Route("/", endpoint=homepage)])
+    client = test_client_factory(app, raise_server_exceptions=False)
+    assert client.get("/").status_code == 500
+
+    app.exception_handlers[KeyError] = key_error
+    app.debug = False
+
+    response = client.get("/")
+    assert response.status_code == 418
+    assert response.json() == {"detail": "Key error"}
+
+
+def test_app_read_only_exception_handlers(test_client_factory):
+    async def homepage(request):
+        raise RuntimeError()
+
+    handlers = types.MappingProxyType({500: error_500})
+    app = Starlette(routes=[Route("/", endpoint=homepage)], exception_handlers=handlers)
+    assert app.exception_handlers is handlers
+
+    app.add_exception_handler(405, method_not_allowed)
+    assert app.exception_handlers == {500: error_500, 405: method_not_allowed}
+    assert dict(handlers) == {500: error_500}
+
+    client = test_client_factory(app, raise_server_exceptions=False)
+    assert client.get("/").json() == {"detail": "Server Error"}
+    assert client.post("/").json() == {"detail": "Custom message"}
+
+
+def test_app_asgi_middleware_decorator(test_client_factory):
+    app = Starlette(routes=[Route("/", endpoint=async_homepage)])
+
+    @app.middleware("asgi")
+    async def add_header(scope, receive, send, call_app):
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                message["headers"].append((b"x-middleware", b"asgi"))
+            await send(message)
+
+        await call_app(scope, receive, wrapped_send)
+
+    client = test_client_factory(app)
+    response = client.get("/")
+    assert response.text == "Hello, world!"
+    assert response.headers["x-middleware"] == "asgi"
+
+
+def test_app_middleware_stack_built_lazily(test_client_factory):
+    app = Starlette(routes=[Route("/", endpoint=async_homepage)])
+    assert app.middleware_stack is None
+
+    client = test_client_factory(app)
+    response = client.get("/")
+    assert response.status_code == 200
+    assert app.middleware_stack is not None
+
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=["testserver"])
+    assert app.middleware_stack is None
+    response = client.get("/")
+    assert response.status_code == 200
+    assert isinstance(app.middleware_stack.app, TrustedHostMiddleware)
+
+
 def test_app_add_route(test_client_factory):
     async def homepage(request):
         return PlainTextResponse("Hello, World!")
@@ -4,7 +4,11 @@ import anyio
 import pytest
 
 from starlette.applications import Starlette
-from starlette.concurrency import run_until_first_complete
+from starlette.concurrency import (
+    iterate_in_threadpool,
+    run_in_threadpool,
+    run_until_first_complete,
+)
 from starlette.requests import Request
 from starlette.responses import Response
 from starlette.routing import Route
@@ -40,3 +44,41 @@ def test_accessing_context_from_threaded_sync_endpoint(test_client_factory) -> N
 
     resp = client.get("/")
     assert resp.content == b"data"
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("chunk_size", [1, 2, 64])
+async def test_iterate_in_threadpool(chunk_size):
+    iterator = iter(range(5))
+    items = [item async for item in iterate_in_threadpool(iterator, chunk_size)]
+    assert items == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.anyio
+async def test_run_in_threadpool():
+    def func(a, b=0):
+        return a + b
+
+    assert await run_in_threadpool(func, 1) == 1
+    assert await run_in_threadpool(func, 1, b=2) == 3
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_iterate_in_threadpool_invalid_chunk_size(chunk_size):
+    with pytest.raises(ValueError):
+        iterate_in_threadpool(iter([1, 2]), chunk_size)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+async def test_iterate_in_threadpool_yields_items_before_error(chunk_size):
+    def numbers():
+        yield 1
+        yield 2
+        raise RuntimeError("boom")
+
+    items = []
+    with pytest.raises(RuntimeError, match="boom"):
+        async for item in iterate_in_threadpool(numbers(), chunk_size):
+            items.append(item)
+    assert items == [1, 2]
@@ -1,4 +1,6 @@
+import gc
 import warnings
+import weakref
 
 import pytest
 
@@ -119,6 +121,48 @@ def test_force_500_response(test_client_factory):
     assert response.text == ""
 
 
+def test_exception_handler_lookup_follows_mro(test_client_factory):
+    class CustomError(RuntimeError):
+        pass
+
+    def raise_custom_error(request):
+        raise CustomError()
+
+    def runtime_error(request, exc):
+        return PlainTextResponse("runtime error", status_code=500)
+
+    def custom_error(request, exc):
+        return PlainTextResponse("custom error", status_code=500)
+
+    app = ExceptionMiddleware(
+        Router(routes=[Route("/", endpoint=raise_custom_error)]),
+        handlers={RuntimeError: runtime_error},
+    )
+    client = test_client_factory(app)
+    assert client.get("/").text == "runtime error"
+    assert client.get("/").text == "runtime error"
+
+    app.add_exception_handler(CustomError, custom_error)
+    assert client.get("/").text == "custom error"
+
+
+def test_exception_handler_cache_does_not_keep_exception_classes_alive():
+    def runtime_error(request, exc):
+        return PlainTextResponse("runtime error", status_code=500)  # pragma: no cover
+
+    app = ExceptionMiddleware(Router(), handlers={RuntimeError: runtime_error})
+
+    class DynamicError(RuntimeError):
+        pass
+
+    assert app._lookup_exception_handler(DynamicError()) is not None
+    ref = weakref.ref(DynamicError)
+    del DynamicError
+    gc.collect()
+    assert ref() is None
+    assert len(app._handler_cache) == 0
+
+
 def test_repr():
     assert repr(HTTPException(404)) == (
         "HTTPException(status_code=404, detail='Not Found')"
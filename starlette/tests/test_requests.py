@@ -281,6 +281,24 @@ def test_request_state_object():
         s.new
 
 
+def test_request_state_object_shares_scope_state():
+    scope = {"state": {"old": "foo"}}
+
+    first = State(scope["state"])
+    second = State(scope["state"])
+
+    first.new = "value"
+    assert second.new == "value"
+    assert second.old == "foo"
+    assert scope["state"] == {"old": "foo", "new": "value"}
+    assert first._state is scope["state"]
+
+    del second.old
+    assert scope["state"] == {"new": "value"}
+    with pytest.raises(AttributeError):
+        first.old
+
+
 def test_request_state(test_client_factory):
     async def app(scope, receive, send):
         request = Request(scope, receive)
@@ -179,6 +179,24 @@ def test_sync_streaming_response(test_client_factory):
     assert response.text == "1, 2, 3, 4, 5"
 
 
+def test_sync_streaming_response_threadpool_batch_size(test_client_factory):
+    async def app(scope, receive, send):
+        generator = (str(i) for i in range(10))
+        response = StreamingResponse(
+            generator, media_type="text/plain", threadpool_batch_size=4
+        )
+        await response(scope, receive, send)
+
+    client = test_client_factory(app)
+    response = client.get("/")
+    assert response.text == "0123456789"
+
+
+def test_sync_streaming_response_invalid_threadpool_batch_size():
+    with pytest.raises(ValueError):
+        StreamingResponse(iter([b"data"]), threadpool_batch_size=0)
+
+
 def test_response_headers(test_client_factory):
     async def app(scope, receive, send):
         headers = {"x-header-1": "123", "x-header-2": "456"}